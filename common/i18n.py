@@ -521,6 +521,7 @@ Otros usos:
   'Parsing.': 'Haciendo análisis sintáctico.',
   'Performing semantic checks.': 'Haciendo análisis semántico.',
   'Compiling.': 'Compilando.',
+  'Using cached compilation.': 'Usando el programa ya compilado.',
   'Starting program execution.': 'Ejecutando el programa.',
   'Program execution finished.': 'Ejecución finalizada.',
 
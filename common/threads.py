@@ -54,3 +54,7 @@ else:
 
 queue_empty = queue.Empty
 
+#### Queue for workers running in a thread of the same process
+
+ThreadQueue = queue.Queue
+
@@ -28,8 +28,10 @@ def python_major_version():
 
 if python_major_version() < 3:
     from StringIO import StringIO
+    str_intern = intern
 else:
     from io import StringIO
+    str_intern = sys.intern
 
 try:
     import hashlib as md5
@@ -144,18 +146,16 @@ def tokset_difference(s1, s2):
             res[k] = v
     return res
 
-def seq_sorted(xs, key=lambda x: x):
-    if python_major_version() < 3:
-        xs = [(key(x), x) for x in xs]
-        xs.sort(lambda a, b: cmp(a[0], b[0]))
-        return [xy[1] for xy in xs]
-    else:
-        return list(sorted(xs, key=key))
+def seq_sorted(xs, key=None):
+    # sorted calls the key once per element on both Python 2 and 3,
+    # and compares the keys without any Python-level comparator
+    return sorted(xs, key=key)
 
 def seq_reversed(xs):
-    ys = []
-    for x in xs:
-        ys.insert(0, x) 
+    # xs may be any iterable (e.g. a string or a generator), so build
+    # the list first and reverse it in place
+    ys = list(xs)
+    ys.reverse()
     return ys
 
 def seq_no_repeats(xs):
@@ -18,6 +18,9 @@
 
 import sys
 import os
+import threading
+import collections
+import functools
 import common.utils
 
 if common.utils.python_major_version() < 3:
@@ -48,15 +51,22 @@ import gui.config
 
 import lang.bnf_parser
 import lang.board.formats
+import lang.gbs_parser
 
 #### Main window of the Gobstones GUI
 
+_underline_cache = {}
+
 def search_underline(name):
-    if '&' in name:
-        u = name.index('&')
-        return name.replace('&', ''), u
-    else:
-        return name, None
+    res = _underline_cache.get(name)
+    if res is None:
+        u = name.find('&')
+        if u == -1:
+            res = name, None
+        else:
+            res = name.replace('&', '', 1), u
+        _underline_cache[name] = res
+    return res
 
 def command_for(shortcut):
     if shortcut[0] == 'F':
@@ -64,50 +74,114 @@ def command_for(shortcut):
     elif shortcut[0] == '#':
         return None
     else:
-        c, l = shortcut.split('+')
+        c, _, l = shortcut.partition('+')
         assert c == 'Ctrl'
         return '<Control-' + l.lower() + '>'
 
-def build_menu(menu, root, toplevel):
-    menu = menu[:]
+_shortcut_cache = {}
+
+def compile_shortcut(shortcut):
+    """Return the pair (event sequence, accelerator label) for a shortcut
+    of a menu spec, e.g. ('<Control-n>', 'Ctrl+N') for 'Ctrl+N'. The
+    sequence is None for shortcuts that are only displayed ('#Ctrl+Z')."""
+    res = _shortcut_cache.get(shortcut)
+    if res is None:
+        res = command_for(shortcut), shortcut.strip('#')
+        _shortcut_cache[shortcut] = res
+    return res
+
+class LazyMenu(object):
+    """Submenu whose entries are built by calling builder(*args) the
+    first time the submenu is opened. Their shortcuts are bound with
+    apply_bindings, sharing the given set of unbound sequences."""
+
+    def __init__(self, unbound, builder, *args):
+        self.unbound = unbound
+        self.builder = builder
+        self.args = args
+        self.built = False
+
+    def populate(self, m):
+        if self.built: return
+        self.built = True
+        apply_bindings(m, fill_menu(m, self.builder(*self.args)),
+                       self.unbound)
+
+def compile_menu(menu, root):
+    """Build the tkinter.Menu described by the given menu spec.
+    Return the menu widget and the dictionary {sequence: command} of
+    keyboard bindings for its shortcuts (see apply_bindings)."""
     m = tkinter.Menu(root)
-    while menu != []:
-        name = menu.pop(0)
-        
-        name, underline = search_underline(name)
-        if name == '--':
-            m.add_separator()
-            continue
-
-        submenu = menu.pop(0)
-        if isinstance(submenu, list):
-            m.add_cascade(
-                label=name,
-                menu=build_menu(submenu, m, toplevel),
-                underline=underline
-            )
-            continue
-        if isinstance(submenu, tuple):
-            cmd, shortcut = submenu
-            csh = command_for(shortcut)
-            shortcut = shortcut.strip('#')
-            if csh is not None:
-                toplevel.unbind_class('Text', csh)
-                toplevel.bind_all(csh, cmd)
-        else:
-            cmd = submenu
-            shortcut = None
-        m.add_command(label=name, command=cmd, underline=underline, accelerator=shortcut)
-    return m
+    return m, fill_menu(m, menu)
+
+def fill_menu(m, menu):
+    """Add the entries of the menu spec to the menu widget m, walking
+    the submenus with an explicit stack. Return the dictionary of keyboard
+    bindings for the shortcuts (if a shortcut is repeated, the last
+    one wins)."""
+    bindings = collections.OrderedDict()
+    stack = [(m, menu)]
+    while stack != []:
+        m, menu = stack.pop()
+        entries = iter(menu)
+        for name in entries:
+            name, underline = search_underline(name)
+            if name == '--':
+                m.add_separator()
+                continue
+
+            submenu = next(entries)
+            if isinstance(submenu, list):
+                sm = tkinter.Menu(m)
+                m.add_cascade(label=name, menu=sm, underline=underline)
+                stack.append((sm, submenu))
+                continue
+            if isinstance(submenu, LazyMenu):
+                sm = tkinter.Menu(m)
+                sm.configure(postcommand=lambda sm=sm, submenu=submenu: submenu.populate(sm))
+                m.add_cascade(label=name, menu=sm, underline=underline)
+                continue
+            if isinstance(submenu, tuple):
+                cmd, shortcut = submenu
+                csh, shortcut = compile_shortcut(shortcut)
+                if csh is not None:
+                    bindings[csh] = cmd
+            else:
+                cmd = submenu
+                shortcut = None
+            m.add_command(label=name, command=cmd, underline=underline, accelerator=shortcut)
+    return bindings
+
+def apply_bindings(widget, bindings, unbound):
+    """Bind the shortcuts in the {sequence: command} dictionary
+    application-wide, overriding the bindings of Text widgets. Any
+    widget of the application can be given. The Text class binding
+    of each sequence is only removed the first time it is bound;
+    unbound is the set of sequences already unbound, and is updated."""
+    for csh, cmd in bindings.items():
+        if csh not in unbound:
+            unbound.add(csh)
+            widget.unbind_class('Text', csh)
+        widget.bind_all(csh, cmd)
+
+_font_families_cache = None
+
+def font_families():
+    "Sorted font families whose name starts with a letter (computed once)."
+    global _font_families_cache
+    if _font_families_cache is None:
+        fams = [name for name in set(tkinter.font.families())
+                if 'a' <= name[:1].lower() <= 'z']
+        # sorted computes the key once per family
+        _font_families_cache = sorted(fams, key=lambda name: (name.lower(), name))
+    return _font_families_cache
 
 def menu_font_family(gui):
     def set_to(fam):
         return lambda *args: gui.set_font_family_to('%s' % (fam,), *args)
     menu = []
     submenu = []
-    fams = [x for x in tkinter.font.families()
-                        if 'a' <= x[0].lower() and x[0].lower() <= 'z']
-    fams = common.utils.seq_sorted(fams, key=lambda n: n.lower())
+    fams = font_families()
     for i in range(len(fams)):
           fam = fams[i]
           submenu.append(fam)
@@ -122,52 +196,166 @@ def menu_font_family(gui):
         menu[i].append(menu[i + 1])
     return menu[0]
 
+_FONT_SIZES = (8, 9, 10, 12, 14, 16, 18, 20, 24, 36, 72)
+
 def menu_font_size(gui):
-    def set_to(sz):
-        return lambda *args: gui.set_font_size_to(sz, *args)
-    menu = []
-    for i in [8, 9, 10, 12, 14, 16, 18, 20, 24, 36, 72]:
-        menu.extend([str(i), set_to(i)])
-    return menu
+    return [item
+            for sz in _FONT_SIZES
+            for item in (str(sz), functools.partial(gui.set_font_size_to, sz))]
+
+_gbb_format = lang.board.formats.AvailableFormats['gbb']()
 
 def board_to_string(board):
-    return lang.board.formats.AvailableFormats['gbb']().to_string(board, style='compact')
+    return _gbb_format.to_string(board, style='compact')
 
 def board_from_string(board, s):
-    return lang.board.formats.AvailableFormats['gbb']().from_string(board, s)
+    return _gbb_format.from_string(board, s)
 
 class CurrentRun(object):
     pass
 
+def module_mtimes(tree):
+    """Return a list of (filename, mtime) for every module imported,
+    directly or indirectly, by the given (linted) program."""
+    res = []
+    pending = [tree]
+    while pending != []:
+        t = pending.pop()
+        if not hasattr(t, 'module_handler'): continue
+        for mdl_name, mdl_tree in t.module_handler.parse_trees():
+            fn = mdl_tree.source_filename
+            res.append((fn, os.path.getmtime(fn)))
+            pending.append(mdl_tree)
+    return res
+
+class CompileCache(object):
+    """Cache of the most recently compiled programs, keyed by filename
+    and source text. An entry is discarded if any of the modules it
+    imports has changed on disk."""
+
+    def __init__(self, size=8):
+        self._size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, filename, text):
+        # the prelude is imported implicitly, so whether there is one
+        # is part of the key
+        has_prelude = lang.gbs_parser.prelude_for_file(filename) is not None
+        return filename, has_prelude, text
+
+    def get(self, filename, text):
+        key = self._key(filename, text)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None: return None
+            compiled_program, mtimes = entry
+            for fn, mtime in mtimes:
+                if not os.path.exists(fn) or os.path.getmtime(fn) != mtime:
+                    return None
+            # reinsert as the most recently used
+            self._entries[key] = entry
+            return compiled_program
+
+    def put(self, filename, text, compiled_program, mtimes):
+        key = self._key(filename, text)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (compiled_program, mtimes)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+# Phases of a run, as published by InterpreterWorker.status
+STATUS_NONE, STATUS_PARSING, STATUS_LINTING, STATUS_COMPILING, \
+STATUS_CACHED, STATUS_RUNNING = range(6)
+
+STATUS_NAMES = {
+    STATUS_PARSING: 'Parsing.',
+    STATUS_LINTING: 'Performing semantic checks.',
+    STATUS_COMPILING: 'Compiling.',
+    STATUS_CACHED: 'Using cached compilation.',
+    STATUS_RUNNING: 'Starting program execution.',
+}
+
 class InterpreterWorker(object):
+    """Runs a Gobstones program in a thread, sharing memory with the GUI.
+    The board given in the START message belongs to the worker until
+    it is sent back in the OK message.
+
+    Progress is not sent through the queue: the worker just overwrites
+    its status attribute, and the GUI reads it when it sees fit."""
+
+    def __init__(self, compile_cache):
+        self._cancelled = threading.Event()
+        self._compile_cache = compile_cache
+        self.status = STATUS_NONE
+
+    def cancel(self):
+        "Ask the worker to stop. The interpreter checks it every tick."
+        self._cancelled.set()
 
     def run(self, queue_in, queue_out):
         op = queue_in.get()
-        assert op[0] in ['START', 'EXIT']
+        assert op[0] in ['START', 'CHECK', 'EXIT']
         if op[0] == 'EXIT': return
-        _, filename, current_text, board_repr = op
+        if op[0] == 'CHECK':
+            self._check(queue_out, op[1], op[2])
+            return
+        _, filename, current_text, board = op
+        try:
+            compiled_program = self._compile_cache.get(filename, current_text)
+            if compiled_program is not None:
+                self.status = STATUS_CACHED
+            else:
+                compiled_program = self._compile(filename, current_text)
+
+            self.status = STATUS_RUNNING
+            res = self._interp(compiled_program, board)
+            if res is None: return
+            self._ok(queue_out, board, res)
+        except SourceException as exception:
+            self._fail(queue_out, exception)
+
+    def _compile(self, filename, current_text):
+        tools = common.tools.tools
+        self.status = STATUS_PARSING
+        tree = tools.parse_string_try_prelude(current_text, filename)
+        assert tree
+        self.status = STATUS_LINTING
+        tools.lint(tree, strictness='lax')
+        #tools.check_live_variables(tree)
+        #tools.typecheck(tree)
+        self.status = STATUS_COMPILING
+        compiled_program = tools.compile(tree)
+        self._compile_cache.put(filename, current_text, compiled_program,
+                                module_mtimes(tree))
+        return compiled_program
+
+    def _check(self, queue_out, filename, current_text):
         tools = common.tools.tools
-        board = lang.gbs_board.Board((1, 1))
-        board_from_string(board, board_repr)
         try:
-            queue_out.put(('LOG', i18n.i18n('Parsing.')))
             tree = tools.parse_string_try_prelude(current_text, filename)
             assert tree
-            queue_out.put(('LOG', i18n.i18n('Performing semantic checks.')))
-            tools.lint(tree, strictness='lax')
-            #tools.check_live_variables(tree)
-            #tools.typecheck(tree)
-            queue_out.put(('LOG', i18n.i18n('Compiling.')))
-            compiled_program = tools.compile(tree)
-
-            queue_out.put(('LOG', i18n.i18n('Starting program execution.')))
-            res = tools.interp(compiled_program, board)
-            self._ok(queue_out, board, res)
+            tools.lint(tree, strictness='strict')
+            tools.check_live_variables(tree)
+            tools.typecheck(tree)
+            queue_out.put(('CHECK_OK',))
         except SourceException as exception:
             self._fail(queue_out, exception)
 
+    def _interp(self, compiled_program, board):
+        "Run the program, returning None if the run was cancelled."
+        vm = common.tools.tools.GbsVmInterpreter()
+        vm.init_program(compiled_program, board)
+        while not self._cancelled.is_set():
+            for i in range(gui.config.IterationsPerTick):
+                r = vm.step()
+                if r[0] == 'END':
+                    return r[1]
+        return None
+
     def _ok(self, queue, board, result):
-        queue.put(('OK', board_to_string(board), result))
+        queue.put(('OK', board, result))
 
     def _fail(self, queue, exception):
         # Note: we cannot send an exception directly through a queue.Queue / multiprocessing.Queue
@@ -180,7 +368,12 @@ class GUI(tkinter.Tk):
         tkinter.Tk.__init__(self, *args, **kwargs)
 
         self._font = gui.config.DefaultFont
+        self._font_apply_pending = None
+        self._font_applied = None
         self.tools = common.tools.tools
+        self._compile_cache = CompileCache()
+        # sequences whose Text class binding was removed (see apply_bindings)
+        self._text_unbound = set()
 
         eframe = tkinter.Frame(self)
         self.editor = gui.editor.Editor(self.tools, eframe, font=self._font)
@@ -190,35 +383,32 @@ class GUI(tkinter.Tk):
 
         self.menu = self._menubar()
         
-        self.unbind_class('Text', '<Control-plus>')
-        self.bind_all('<Control-plus>', self.inc_font_size)
-        self.unbind_class('Text', '<Control-minus>')
-        self.bind_all('<Control-minus>', self.dec_font_size)
+        apply_bindings(self, {
+            '<Control-plus>': self.inc_font_size,
+            '<Control-minus>': self.dec_font_size,
+        }, self._text_unbound)
 
         self._init_filetypes()
 
         self.bind_all('<Escape>', self.editor.clear_messages)
 
         self.file_new()
-        menubar = build_menu(self.menu, self, self)
+        menubar, bindings = compile_menu(self.menu, self)
+        apply_bindings(self, bindings, self._text_unbound)
         self.config(menu=menubar)
 
         self._running = False
+        self._run = None
         self._prepare_for_next_run()
-        self._last_alarm_id = None
         self._last_directory = None
 
         self.editor.focus_set()
 
     def _running_start(self):
         self._running = True
-        self._last_alarm_id = None
 
     def _running_end(self):
         self._running = False
-        if self._last_alarm_id:
-            self.after_cancel(self._last_alarm_id)
-        self._last_alarm_id = None
 
     def _menubar(self):
         return [
@@ -244,7 +434,7 @@ class GUI(tkinter.Tk):
                 i18n.i18n('&Indent region'), (self.editor.indent_region, 'Ctrl+L'),
                 i18n.i18n('&Dedent region'), (self.editor.dedent_region, 'Ctrl+H'),
                 '--',
-                i18n.i18n('&Font family'), menu_font_family(self),
+                i18n.i18n('&Font family'), LazyMenu(self._text_unbound, menu_font_family, self),
                 i18n.i18n('Font &size'), menu_font_size(self),
             ],
             i18n.i18n('&Gobstones'), [
@@ -319,12 +509,21 @@ class GUI(tkinter.Tk):
 
     def file_open_fn(self, fn):
         if fn is None or fn == (): return
-        if os.path.exists(fn):
-            self._last_directory = os.path.dirname(fn)
+        if self._enter_directory_of(fn):
             if not self._file_close(): return
             self.editor.open_file(fn)
             self._fn_title(fn)
 
+    def _enter_directory_of(self, fn):
+        """Remember the directory of fn for the next file dialog.
+        Return False, without doing so, if fn does not exist."""
+        try:
+            os.stat(fn)
+        except OSError:
+            return False
+        self._last_directory = os.path.split(fn)[0]
+        return True
+
     def file_quit(self, *args):
         if not self._file_close(): return
         self.destroy()
@@ -375,34 +574,76 @@ class GUI(tkinter.Tk):
         else:
             return i18n.i18n('Untitled')
 
-    def _parse_contents(self):
-        return self.tools.parse_string_try_prelude(
-            self.editor.current_text(),
-            self._filename_or_untitled()
-        )
-
     def _prepare_for_next_run(self):
+        if self._run is not None:
+            # stop polling the previous run (e.g. the run was aborted)
+            self._stop_polling(self._run)
+
         self._run = CurrentRun()
         self._run.running = False
+        self._run.checking = False
+        self._run.logged_status = STATUS_NONE
+        self._run.poll_id = None
 
-        self._run.worker = InterpreterWorker()
-        self._run.queue_out = common.threads.Queue()
-        self._run.queue_in = common.threads.Queue()
+        self._run.worker = InterpreterWorker(self._compile_cache)
+        self._run.queue_out = common.threads.ThreadQueue()
+        self._run.queue_in = common.threads.ThreadQueue()
         # worker's queue_in is app's queue_out and vice-versa:
-        self._run.process = common.threads.Process(target=self._run.worker.run, args=(self._run.queue_out, self._run.queue_in,))
-        self._run.process.start()
+        self._run.thread = threading.Thread(target=self._run.worker.run, args=(self._run.queue_out, self._run.queue_in,))
+        self._run.thread.daemon = True
+        self._run.thread.start()
+
+    def _poll_run(self, run, delay=gui.config.TickDelay):
+        """Show the phase the worker is in and handle its answer, if it
+        has already arrived. Otherwise, poll again after the given delay.
+        Tk is only ever called from the main thread: the worker just
+        leaves its answer in the queue."""
+        run.poll_id = None
+        if run is not self._run or not run.running: return
+        self._show_status(run)
+        try:
+            res = run.queue_in.get_nowait()
+        except common.threads.queue_empty:
+            # once the program is running there are no more phases to
+            # show, so the queue is checked less and less often
+            if run.logged_status == STATUS_RUNNING:
+                delay = min(2 * delay, gui.config.MaxPollDelay)
+            run.poll_id = self.after(delay, self._poll_run, run, delay)
+            return
+        self.gobstones_continue_run(run, res)
+
+    def _stop_polling(self, run):
+        if run.poll_id is not None:
+            self.after_cancel(run.poll_id)
+            run.poll_id = None
 
     def gobstones_check(self, *args):
+        # the checks are performed by the worker; while they are in
+        # flight, neither checking nor running is allowed
+        if self._running:
+            return
+        self._running_start()
+
         self.editor.clear_messages()
-        try:
-            tree = self._parse_contents()
-            if not tree: return False
-            self.tools.lint(tree, strictness='strict')
-            self.tools.check_live_variables(tree)
-            self.tools.typecheck(tree)
+
+        if self._run.running:
+            self._prepare_for_next_run()
+
+        self._run.running = True
+        self._run.checking = True
+        self._run.queue_out.put(('CHECK',
+            self._filename_or_untitled(),
+            self.editor.current_text(),
+        ))
+        self._poll_run(self._run)
+
+    def gobstones_end_check(self, exception=None):
+        self._prepare_for_next_run()
+        if exception is None:
             self.editor.show_check_ok(i18n.i18n('All checks ok'))
-        except SourceException as exception:
+        else:
             self.editor.show_error(exception)
+        self._running_end()
 
     def gobstones_start_run(self, *args):
         if self._running:
@@ -422,51 +663,53 @@ class GUI(tkinter.Tk):
         self._run.queue_out.put(('START', 
             self._filename_or_untitled(),
             self.editor.current_text(),
-            board_to_string(self.viewer.board1),
+            self.viewer.board1.clone(),
         ))
-
-        self._last_alarm_id = self.after(gui.config.TickDelay, self.gobstones_continue_run)
-
-    def gobstones_continue_run(self):
-        if not self._run.running: return
-        try:
-            while True:
-                res = self._run.queue_in.get_nowait()
-                if res[0] == 'OK':
-                    board_from_string(self.viewer.board1, res[1])
-                    self.gobstones_end_run(res[2])
-                    break
-                elif res[0] == 'FAIL':
-                    reduced = res[1]
-                    self.gobstones_fail_run(reduced[0](*reduced[1]))
-                    break
-                elif res[0] == 'LOG':
-                    self._run.log(res[1])
-                else:
-                    print(res)
-                    assert False
-        except common.threads.queue_empty as e:
-            self._last_alarm_id = self.after(gui.config.TickDelay, self.gobstones_continue_run)
+        self._poll_run(self._run)
+
+    def _show_status(self, run):
+        "Log the phase the worker is in, if it changed since last shown."
+        status = run.worker.status
+        if status != run.logged_status:
+            run.logged_status = status
+            run.log(i18n.i18n(STATUS_NAMES[status]))
+
+    def gobstones_continue_run(self, run, res):
+        if res[0] == 'OK':
+            # the worker is done with its board, so it can be adopted
+            # by the viewer without copying its cells
+            self.viewer.board1.take_contents_from(res[1])
+            self.gobstones_end_run(res[2])
+        elif res[0] == 'CHECK_OK':
+            self.gobstones_end_check()
+        elif res[0] == 'FAIL':
+            reduced = res[1]
+            exception = reduced[0](*reduced[1])
+            if run.checking:
+                self.gobstones_end_check(exception)
+            else:
+                self.gobstones_fail_run(exception)
+        else:
+            print(res)
+            assert False
 
     def gobstones_abort_run(self):
         area = lang.bnf_parser.fake_bof()
         if self._run.running:
-            common.threads.terminate_process(self._run.process)
+            self._run.worker.cancel()
         self.gobstones_fail_run(SourceException(i18n.i18n('Execution interrupted by the user'), area))
 
     def gobstones_end_run(self, result):
         self._run.log(i18n.i18n('Program execution finished.'))
         self._prepare_for_next_run()
         self.editor.end_run()
-        self.viewer.revalidate()
         if len(result) > 0:
             result_msg = ['%s -> %s\n' % (var, val) for var, val in result]
             self.editor.show_result(''.join(result_msg))
         else:
             self.editor.clear_messages()
         if self.viewer:
-            self.viewer.refresh()
-            self.viewer.show_board1()
+            self.viewer.apply_run_end()
         self._running_end()
 
     def gobstones_fail_run(self, exception):
@@ -549,9 +792,8 @@ class GUI(tkinter.Tk):
 
     def board_load_fn(self, fn):
         if fn is None: return
-        if not os.path.exists(fn):
+        if not self._enter_directory_of(fn):
             return
-        self._last_directory = os.path.dirname(fn)
         if not self.viewer:
             self.open_viewer()
         fmt = lang.board.formats.format_for(fn)
@@ -581,14 +823,17 @@ class GUI(tkinter.Tk):
         self.viewer.save_board(fn, num, fmt)
 
     def destroy(self):
+        # the worker is stopped while Tk is still alive, so that no
+        # poll of the run is left pending on a destroyed interpreter
+        self._end_worker()
         self.close_viewer()
         tkinter.Tk.destroy(self)
-        self._end_worker()
 
     def _end_worker(self):
         if self._run is not None:
+            self._stop_polling(self._run)
             if self._run.running:
-                common.threads.terminate_process(self._run.process)
+                self._run.worker.cancel()
             self._run.queue_out.put(('EXIT',))
 
     def version(self, *args):
@@ -605,23 +850,35 @@ class GUI(tkinter.Tk):
 
     def set_font_family_to(self, family, *args):
         self._font = (family, self._font[1])
-        self.set_font()
+        self._schedule_set_font()
 
     def set_font_size_to(self, size, *args):
         self._font = (self._font[0], size)
-        self.set_font()
+        self._schedule_set_font()
 
     def inc_font_size(self, *args):
         if self._font[1] < 100:
             self._font = (self._font[0], self._font[1] + 1)
-            self.set_font()
+            self._schedule_set_font()
 
     def dec_font_size(self, *args):
         if self._font[1] > 8:
             self._font = (self._font[0], self._font[1] - 1)
-            self.set_font()
+            self._schedule_set_font()
+
+    def _schedule_set_font(self):
+        # coalesce repeated changes (e.g. a held Ctrl+plus) into
+        # a single reconfiguration when Tk becomes idle
+        if self._font_apply_pending is None:
+            self._font_apply_pending = self.after_idle(self._apply_font_now)
+
+    def _apply_font_now(self):
+        self._font_apply_pending = None
+        self.set_font()
 
     def set_font(self):
+        if self._font == self._font_applied: return
+        self._font_applied = self._font
         font = self._font
         self.editor.options_set_font(font)
         if self.viewer:
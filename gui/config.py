@@ -18,5 +18,7 @@
 
 IterationsPerTick = 8192
 TickDelay = 100
+# Longest delay between two checks for the result of a running program
+MaxPollDelay = 1000
 
 DefaultFont = ('Courier New', 10)
@@ -30,8 +30,17 @@ class JudgeGUI(GUI):
 
     def __init__(self, *args, **kwargs):
         self._current_problem = ''
+        self._last_alarm_id = None
         GUI.__init__(self, *args, **kwargs)
 
+    def _running_end(self):
+        # the next step of the test drivers may still be scheduled (e.g.
+        # when the run is aborted); it must not fire during the next run
+        if self._last_alarm_id is not None:
+            self.after_cancel(self._last_alarm_id)
+            self._last_alarm_id = None
+        GUI._running_end(self)
+
     def _menubar(self):
         mnu = []
         bundle_filenames = gbs_judge.collect_bundles()
@@ -767,6 +767,11 @@ class BoardViewer(tkinter.Tk):
     def revalidate(self):
         self.board1.invalid = False
 
+    def apply_run_end(self):
+        "Show the final board of a run, painting it only once."
+        self.revalidate()
+        self.show_board1()
+
     def refresh(self):
         if self.visible_board == 0:
             self.board0_frame.refresh_aspect()
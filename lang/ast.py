@@ -123,6 +123,11 @@ class ASTNode(common.position.ProgramElement):
         self.live_out = None
         self.live_gen = None
 
+        # Used by the type inference, and read by the compiler
+        self.type_annot = None
+        self.type_annotation = None
+        self.index_type_annotation = None
+
     def __repr__(self):
         return 'AST(' + repr(self.children) + ')'
 
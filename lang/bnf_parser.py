@@ -145,7 +145,15 @@ class Production(object):
         if len(rule_action) == 1:
             self.action = None
         else:
-            self.action = common.utils.trim_blanks(rule_action[1]).split(' ')
+            # Interned, so that every AST node label built from an
+            # action is the same string object as the equal literal
+            # elsewhere (e.g. the keys of the compiler's handler tables):
+            # dict lookups then match the key by its pointer check,
+            # without comparing the characters.
+            self.action = [
+                common.utils.str_intern(part)
+                for part in common.utils.trim_blanks(rule_action[1]).split(' ')
+            ]
 
     def __repr__(self):
         if self.action:
@@ -330,6 +330,16 @@ class Board(object):
         self._restore_from(other)
         self.clear_changelog()
 
+    def take_contents_from(self, other):
+        """Set the contents of this board to the contents of the other
+        board, without copying them. The other board must not be used
+        afterwards. Also, clear the changelog, as in clone_from."""
+        self.size = other.size
+        self.head = other.head
+        self.cells = other.cells
+        other.cells = None
+        self.clear_changelog()
+
     def _restore_from(self, other):
         "Set the contents of this board to the contents of the other board."
         self.size = other.size
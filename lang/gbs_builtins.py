@@ -18,6 +18,8 @@
 """Definition of Gobstones builtin functions, procedures and constants."""
 
 import sys
+import operator
+import itertools
 
 from lang.gbs_type import (
     BasicTypes,
@@ -47,7 +49,22 @@ from common.utils import (
 #### Definition of built-in functions and constants.
 
 class GbsRuntimeException(DynamicException):
-    """Base exception for Gobstones runtime errors."""
+    """Base exception for Gobstones runtime errors.
+
+    The message may also be given as a function returning it, to
+    postpone building it (e.g. a backtrace) until it is first needed.
+    The interpreter stops on runtime errors, so the state it describes
+    does not change in the meantime."""
+
+    def _get_msg(self):
+        if callable(self._msg):
+            self._msg = self._msg()
+        return self._msg
+
+    def _set_msg(self, msg):
+        self._msg = msg
+
+    msg = property(_get_msg, _set_msg)
 
     def error_type(self):
         "Description of the exception type."
@@ -84,11 +101,48 @@ TYPE_BB = GbsFunctionType(
                 GbsTupleType([GbsBoolType()]),
                 GbsTupleType([GbsBoolType()]))
 
-class GbsEnum(object):
-    """Represents an enumerated type."""
+# Names of the types of Gobstones values, as returned by poly_typeof.
+# poly_typeof always returns one of these objects, so they can be
+# compared by identity.
+TYPE_BOOL = 'Bool'
+TYPE_INT = 'Int'
+TYPE_DIR = 'Dir'
+TYPE_COLOR = 'Color'
 
-    def __init__(self, i):
-        self._ord = i
+class GbsEnum(object):
+    """Represents an enumerated type.
+
+    Each subclass has a fixed set of interned instances, created once
+    by _intern, so that GbsEnum(i) always returns the same object and
+    next/prev/opposite are lookups in precomputed tables."""
+
+    __slots__ = ('_ord',)
+
+    def __new__(cls, i):
+        # a negative i would silently index from the end
+        if not 0 <= i < len(cls._INSTANCES):
+            raise IndexError('%s ord out of range: %s' % (cls.__name__, i))
+        return cls._INSTANCES[i]
+
+    @classmethod
+    def _intern(cls, size):
+        """Create the instances of the enumerated type, and the
+        tables mapping each ord to its next, previous and opposite
+        instances. The size should be a power of two, so that
+        wrapping around is just masking the ord."""
+        assert size > 0 and size & (size - 1) == 0
+        mask = size - 1
+        half = size >> 1
+        instances = []
+        for i in range(size):
+            instance = object.__new__(cls)
+            instance._ord = i
+            instances.append(instance)
+        cls._INSTANCES = tuple(instances)
+        cls._NEXT = tuple([instances[(i + 1) & mask] for i in range(size)])
+        cls._PREV = tuple([instances[(i - 1) & mask] for i in range(size)])
+        cls._OPPOSITE = tuple([instances[i ^ half] for i in range(size)])
+        return cls._INSTANCES
 
     def enum_type(self):
         """Subclasses should implement the method to return the name
@@ -103,51 +157,59 @@ class GbsEnum(object):
     def next(self):
         """Returns the next element in the enumerated type. (Wrap around
         if the maximum is reached)."""
-        return self.__class__((self._ord + 1) % self.enum_size())
+        return self._NEXT[self._ord]
 
     def prev(self):
         """Returns the previous element in the enumerated type. (Wrap around
         if the minimum is reached)."""
-        return self.__class__((self._ord - 1) % self.enum_size())
+        return self._PREV[self._ord]
 
     def opposite(self):
         """Returns the opposite element in the enumerated type.
         Currently only works for enums of an even number of elements,
         returning the opposite element if they were in a circle."""
-        new_i = (self._ord + self.enum_size() / 2) % self.enum_size()
-        return self.__class__(new_i)
+        return self._OPPOSITE[self._ord]
 
     def ord(self):
         """Returns the ord of the instance in the enumerated type."""
         return self._ord
 
     def __eq__(self, other):
-        return isinstance(other, GbsEnum) and \
-               self.enum_type() == other.enum_type() and \
-               self._ord == other.ord()
+        # instances are interned
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    __hash__ = object.__hash__
+
+    def __reduce__(self):
+        return self.__class__, (self._ord,)
 
 #### Directions
 
-DIRECTION_NAMES = [
+DIRECTION_NAMES = (
     i18n.i18n('North'),
     i18n.i18n('East'),
     i18n.i18n('South'),
     i18n.i18n('West'),
-]
+)
 
-DIRECTION_DELTA = {
-    0: (1, 0),
-    1: (0, 1),
-    2: (-1, 0),
-    3: (0, -1),
-}
+DIRECTION_DELTA = (
+    (1, 0),
+    (0, 1),
+    (-1, 0),
+    (0, -1),
+)
 
 class Direction(GbsEnum):
     "Represents a Gobstones direction."
 
+    __slots__ = ()
+
     def enum_type(self):
         "Return the name of the enumerated type."
-        return 'Dir'
+        return TYPE_DIR
 
     def enum_size(self):
         "Return the size of the enumerated type."
@@ -155,31 +217,31 @@ class Direction(GbsEnum):
 
     def delta(self):
         "Return the delta for this direction."
-        return DIRECTION_DELTA[self.ord()]
+        return DIRECTION_DELTA[self._ord]
 
     def __repr__(self):
-        return DIRECTION_NAMES[self.ord()]
+        return DIRECTION_NAMES[self._ord]
 
-NORTH = Direction(0)
-EAST  = Direction(1)
-SOUTH = Direction(2)
-WEST  = Direction(3)
+DIRECTIONS = Direction._intern(4)
+NORTH, EAST, SOUTH, WEST = DIRECTIONS
 
 #### Colors
 
-COLOR_NAMES = [
+COLOR_NAMES = (
     i18n.i18n('Color0'),
     i18n.i18n('Color1'),
     i18n.i18n('Color2'),
     i18n.i18n('Color3'),
-]
+)
 
 class Color(GbsEnum):
     "Represents a Gobstones color."
 
+    __slots__ = ()
+
     def enum_type(self):
         "Return the name of the enumerated type."
-        return 'Color'
+        return TYPE_COLOR
 
     def enum_size(self):
         "Return the size of the enumerated type."
@@ -187,71 +249,88 @@ class Color(GbsEnum):
 
     def name(self):
         "Return the name of this color."
-        return COLOR_NAMES[self.ord()]
+        return COLOR_NAMES[self._ord]
 
     def __repr__(self):
         return self.name()
 
 NUM_COLORS = 4
-COLOR0 = Color(0)
-COLOR1 = Color(1)
-COLOR2 = Color(2)
-COLOR3 = Color(3)
+COLORS = Color._intern(NUM_COLORS)
+COLOR0, COLOR1, COLOR2, COLOR3 = COLORS
+
+#### Names of the polymorphic builtins
+
+NEXT_NAME = i18n.i18n('next')
+PREV_NAME = i18n.i18n('prev')
+OPPOSITE_NAME = i18n.i18n('opposite')
+UNARY_MINUS_NAME = i18n.i18n('unary-')
+
+# Python types of integer values. The Python version is checked
+# once, here, rather than on every call.
+if sys.version_info[0] < 3:
+    INT_TYPES = (int, long)
+else:
+    INT_TYPES = (int,)
+
+ENUM_TYPES = (bool, Color, Direction)
 
 def isinteger(value):
     "Return True iff the given Python value is integral."
-    if sys.version_info[0] < 3:
-        return isinstance(value, int) or isinstance(value, long)
-    else:
-        return isinstance(value, int)
+    return isinstance(value, INT_TYPES)
 
 def isenum(value):
     "Return True iff x is instance of a Gobstones enumerated type."
-    return isinstance(value, bool) or \
-           isinstance(value, Color) or \
-           isinstance(value, Direction)
+    return isinstance(value, ENUM_TYPES)
+
+# Gobstones values are exactly of one of the INT_TYPES, bool, GbsList,
+# Color or Direction, never of a subclass, so the poly_* functions
+# dispatch on type(value) instead of walking isinstance checks.
+
+_TYPE_NAMES = {bool: TYPE_BOOL}
+for _int_type in INT_TYPES:
+    _TYPE_NAMES[_int_type] = TYPE_INT
 
 def poly_typeof(value):
     "Return the name of the type of the value."
-    if isinstance(value, bool):
-        return 'Bool'
-    elif isinteger(value):
-        return 'Int'
-    elif isinstance(value, list):
-        assert False
-    else:
-        return value.enum_type()
+    type_name = _TYPE_NAMES.get(type(value))
+    if type_name is not None:
+        return type_name
+    assert type(value) is not GbsList
+    return value.enum_type()
 
 def poly_next(value):
     "Return the next value of the same type as the one given."
-    if isinstance(value, bool):
+    typ = type(value)
+    if typ is bool:
         return not value
-    elif isinteger(value):
+    elif typ in INT_TYPES:
         return value + 1
-    elif isinstance(value, list):
-        return [poly_next(elem) for elem in value]
+    elif typ is GbsList:
+        return gbs_list([poly_next(elem) for elem in value])
     else:
         return value.next()
 
 def poly_prev(value):
     "Return the previous value of the same type as the one given."
-    if isinstance(value, bool):
+    typ = type(value)
+    if typ is bool:
         return not value
-    elif isinteger(value):
+    elif typ in INT_TYPES:
         return value - 1
-    elif isinstance(value, list):
-        return [poly_prev(elem) for elem in value]
+    elif typ is GbsList:
+        return gbs_list([poly_prev(elem) for elem in value])
     else:
         return value.prev()
 
 def poly_opposite(value):
     "Return the opposite value of the same type as the one given."
-    if isinstance(value, bool):
+    typ = type(value)
+    if typ is bool:
         return not value
-    elif isinteger(value):
+    elif typ in INT_TYPES:
         return -value
-    elif isinstance(value, list):
-        return [poly_opposite(elem) for elem in value]
+    elif typ is GbsList:
+        return gbs_list([poly_opposite(elem) for elem in value])
     else:
         return value.opposite()
 
@@ -259,7 +338,8 @@ def gbs_poly_opposite(global_state, value):
     """Gobstones builtin function for the opposite value. Works only
     for directions and integers; raises a GbsRuntimeException if that
     is not the case."""
-    if poly_typeof(value) not in ['Dir', 'Int']:
+    typ = type(value)
+    if typ is not Direction and typ not in INT_TYPES:
         msg = i18n.i18n(
             'The argument to opposite should be a direction or an integer')
         raise GbsRuntimeException(msg, global_state.area())
@@ -269,14 +349,15 @@ def gbs_poly_opposite(global_state, value):
 def poly_ord(value):
     """Returns a list of integers representing the ord of the given
     Gobstones value."""
-    if isinstance(value, bool):
+    typ = type(value)
+    if typ is bool:
         if not value:
             return [0]
         else:
             return [1]
-    elif isinteger(value):
+    elif typ in INT_TYPES:
         return [value]
-    elif isinstance(value, list):
+    elif typ is GbsList:
         return [poly_ord(elem) for elem in value]
     else:
         return [value.ord()]
@@ -284,132 +365,209 @@ def poly_ord(value):
 def poly_cmp(global_state, value1, value2, relop):
     """Returns True iff the given relational operator holds for
     the Gobstones values."""
-    if poly_typeof(value1) != poly_typeof(value2):
+    typ1 = type(value1)
+    typ2 = type(value2)
+    if typ1 is bool or typ1 in INT_TYPES:
+        # booleans and integers are compared directly, as they
+        # are ordered the same way as their ords
+        same_type = typ1 is typ2 or (typ1 is not bool and typ2 in INT_TYPES)
+        left, right = value1, value2
+    else:
+        same_type = poly_typeof(value1) is poly_typeof(value2)
+        left, right = poly_ord(value1), poly_ord(value2)
+    if not same_type:
         msg = i18n.i18n(
             'Relational operation between values of different types')
         raise GbsRuntimeException(msg, global_state.area())
-    return relop(poly_ord(value1), poly_ord(value2))
-
-def arith_add(_, x, y):
-    "Add the numbers."
-    return x + y
-
-def arith_sub(_, x, y):
-    "Subtract the numbers."
-    return x - y
-
-def arith_mul(_, x, y):
-    "Multiply the numbers."
-    return x * y
+    return relop(left, right)
+
+def relational_op(relop):
+    """Given a binary relational operator over Python values, return
+    the Gobstones builtin function for it. Booleans and integers of
+    the same type are compared right away; every other case goes
+    through poly_cmp."""
+    def builtin(global_state, value1, value2):
+        typ1 = type(value1)
+        if typ1 is type(value2) and (typ1 is bool or typ1 in INT_TYPES):
+            return relop(value1, value2)
+        return poly_cmp(global_state, value1, value2, relop)
+    return builtin
+
+def arith_type_error(global_state):
+    "Return the exception for an arithmetic operation over non-numbers."
+    msg = i18n.i18n('Arithmetic operation over non-numeric values')
+    return GbsRuntimeException(msg, global_state.area())
+
+def logical_type_error(global_state):
+    "Return the exception for a logical operation over non-booleans."
+    msg = i18n.i18n('Logical operation over non-boolean values')
+    return GbsRuntimeException(msg, global_state.area())
+
+# The arithmetic and logical builtins dynamically check that their
+# arguments are of the right type, raising a GbsRuntimeException if
+# that is not the case.
+
+def arith_op(opr):
+    """Given a binary operator over Python integers that cannot fail,
+    return the Gobstones builtin function for it, with the type check
+    inlined."""
+    def builtin(global_state, x, y):
+        if type(x) not in INT_TYPES or type(y) not in INT_TYPES:
+            raise arith_type_error(global_state)
+        return opr(x, y)
+    return builtin
+
+def logical_op(opr):
+    """Given a binary operator over Python booleans, return the
+    Gobstones builtin function for it, with the type check inlined."""
+    def builtin(global_state, value1, value2):
+        if type(value1) is not bool or type(value2) is not bool:
+            raise logical_type_error(global_state)
+        return opr(value1, value2)
+    return builtin
+
+arith_add = arith_op(operator.add)
+arith_sub = arith_op(operator.sub)
+arith_mul = arith_op(operator.mul)
 
 def arith_pow(global_state, x, y):
     "Return x power y. Check for negative exponents."
+    if type(x) not in INT_TYPES or type(y) not in INT_TYPES:
+        raise arith_type_error(global_state)
     if y < 0:
-        msg = global_state.backtrace(i18n.i18n('Negative exponent'))
+        msg = lambda: global_state.backtrace(i18n.i18n('Negative exponent'))
         raise GbsRuntimeException(msg, global_state.area())
     else:
         return x ** y
 
 def arith_div(global_state, x, y):
     "Return x div y. Check for zero division."
+    if type(x) not in INT_TYPES or type(y) not in INT_TYPES:
+        raise arith_type_error(global_state)
     if y == 0:
-        msg = global_state.backtrace(i18n.i18n('Division by zero'))
+        msg = lambda: global_state.backtrace(i18n.i18n('Division by zero'))
         raise GbsRuntimeException(msg, global_state.area())
     else:
-        return x / y
+        return x // y
 
 def arith_mod(global_state, x, y):
     "Return x mod y. Check for zero division."
+    if type(x) not in INT_TYPES or type(y) not in INT_TYPES:
+        raise arith_type_error(global_state)
     if y == 0:
-        msg = global_state.backtrace(i18n.i18n('Division by zero'))
+        msg = lambda: global_state.backtrace(i18n.i18n('Division by zero'))
         raise GbsRuntimeException(msg, global_state.area())
     else:
         return x % y
 
-def arith_op(opr, global_state, *values):
-    """Given an n-ary arithmetic operator, and n values, return
-    the result, dynamically checking that the values are all of the
-    right Int type. If that is not the case, raise a GbsRuntimeException."""
-    for value in values:
-        if poly_typeof(value) != 'Int':
-            msg = i18n.i18n('Arithmetic operation over non-numeric values')
-            raise GbsRuntimeException(msg, global_state.area())
-    return opr(global_state, *values)
-
-def logical_op(opr, global_state, *values):
-    """Given an n-ary logical operator, and n values, return
-    the result, dynamically checking that the values are all of the
-    right Bool type. If that is not the case, raise a GbsRuntimeException."""
-    for value in values:
-        if poly_typeof(value) != 'Bool':
-            msg = i18n.i18n('Logical operation over non-boolean values')
-            raise GbsRuntimeException(msg, global_state.area())
-    return opr(global_state, *values)
-
-def logical_not(_, value):
+def logical_not(global_state, value):
     "Return the logical negation of the given value."
+    if type(value) is not bool:
+        raise logical_type_error(global_state)
     return not value
 
-def logical_and(_, value1, value2):
-    "Return the logical conjunction of the values."
-    return value1 and value2
-
-def logical_or(_, value1, value2):
-    "Return the logical disjunction of the values."
-    return value1 or value2
+logical_and = logical_op(operator.and_)
+logical_or = logical_op(operator.or_)
 
 def board_put_stone(global_state, color):
     """Put a stone in the board."""
-    if poly_typeof(color) != 'Color':
+    if type(color) is not Color:
         msg = i18n.i18n('The argument to PutStone should be a color')
         raise GbsRuntimeException(msg, global_state.area())
     global_state.board.put_stone(color)
 
 def board_take_stone(global_state, color):
     """Take a stone from the board."""
-    if poly_typeof(color) != 'Color':
+    if type(color) is not Color:
         msg = i18n.i18n('The argument to TakeStone should be a color')
         raise GbsRuntimeException(msg, global_state.area())
     if global_state.board.num_stones(color) > 0:
         global_state.board.take_stone(color)
     else:
-        msg = global_state.backtrace(
+        msg = lambda: global_state.backtrace(
             i18n.i18n('Cannot take stones of color %s') % (color,))
         raise GbsRuntimeException(msg, global_state.area())
 
 def board_move(global_state, direction):
     """Move the head."""
-    if poly_typeof(direction) != 'Dir':
+    if type(direction) is not Direction:
         msg = i18n.i18n('The argument to Move should be a direction')
         raise GbsRuntimeException(msg, global_state.area())
     if global_state.board.can_move(direction):
         global_state.board.move(direction)
     else:
-        msg = global_state.backtrace(
+        msg = lambda: global_state.backtrace(
             i18n.i18n('Cannot move to %s') % (direction,))
         raise GbsRuntimeException(msg, global_state.area())
 
 def board_num_stones(global_state, color):
     """Number of stones of the given color."""
-    if poly_typeof(color) != 'Color':
+    if type(color) is not Color:
         msg = i18n.i18n('The argument to numStones should be a color')
         raise GbsRuntimeException(msg, global_state.area())
     return global_state.board.num_stones(color)
 
 def board_exist_stones(global_state, color):
     """Return True iff there are stones of the given color."""
-    if poly_typeof(color) != 'Color':
+    if type(color) is not Color:
         msg = i18n.i18n('The argument to existStones should be a color')
         raise GbsRuntimeException(msg, global_state.area())
     return global_state.board.exist_stones(color)
 
 def board_can_move(global_state, direction):
     """Return True iff the head can move to the given direction."""
-    if poly_typeof(direction) != 'Dir':
+    if type(direction) is not Direction:
         msg = i18n.i18n('The argument to canMove should be a direction')
         raise GbsRuntimeException(msg, global_state.area())
     return global_state.board.can_move(direction)
 
+# Versions of the board builtins without the dynamic type check of
+# their argument. They are only used by programs that have passed the
+# type checker, which already guarantees the argument types.
+
+def board_put_stone_unchecked(global_state, color):
+    """Put a stone in the board."""
+    global_state.board.put_stone(color)
+
+def board_take_stone_unchecked(global_state, color):
+    """Take a stone from the board."""
+    if global_state.board.num_stones(color) > 0:
+        global_state.board.take_stone(color)
+    else:
+        msg = lambda: global_state.backtrace(
+            i18n.i18n('Cannot take stones of color %s') % (color,))
+        raise GbsRuntimeException(msg, global_state.area())
+
+def board_move_unchecked(global_state, direction):
+    """Move the head."""
+    if global_state.board.can_move(direction):
+        global_state.board.move(direction)
+    else:
+        msg = lambda: global_state.backtrace(
+            i18n.i18n('Cannot move to %s') % (direction,))
+        raise GbsRuntimeException(msg, global_state.area())
+
+def board_num_stones_unchecked(global_state, color):
+    """Number of stones of the given color."""
+    return global_state.board.num_stones(color)
+
+def board_exist_stones_unchecked(global_state, color):
+    """Return True iff there are stones of the given color."""
+    return global_state.board.exist_stones(color)
+
+def board_can_move_unchecked(global_state, direction):
+    """Return True iff the head can move to the given direction."""
+    return global_state.board.can_move(direction)
+
+UNCHECKED_PRIMITIVES = {
+    board_put_stone: board_put_stone_unchecked,
+    board_take_stone: board_take_stone_unchecked,
+    board_move: board_move_unchecked,
+    board_num_stones: board_num_stones_unchecked,
+    board_exist_stones: board_exist_stones_unchecked,
+    board_can_move: board_can_move_unchecked,
+}
+
 # 'Main',
 BUILTINS = [
 
@@ -512,17 +670,17 @@ BUILTINS = [
     ),
 
     BuiltinFunction(
-        i18n.i18n('next'),
+        NEXT_NAME,
         TYPE_AA,
         lambda global_state, x: poly_next(x)
     ),
     BuiltinFunction(
-        i18n.i18n('prev'),
+        PREV_NAME,
         TYPE_AA,
         lambda global_state, x: poly_prev(x)
     ),
     BuiltinFunction(
-        i18n.i18n('opposite'),
+        OPPOSITE_NAME,
         TYPE_AA,
         gbs_poly_opposite
     ),
@@ -534,39 +692,33 @@ BUILTINS = [
     BuiltinFunction(
         i18n.i18n('=='),
         TYPE_AAB,
-        lambda global_state, x, y:
-            poly_cmp(global_state, x, y, lambda a, b: a == b)
+        relational_op(operator.eq)
     ),
 
     BuiltinFunction(
         i18n.i18n('/='),
         TYPE_AAB,
-        lambda global_state, x, y:
-            poly_cmp(global_state, x, y, lambda a, b: a != b)
+        relational_op(operator.ne)
     ),
     BuiltinFunction(
         i18n.i18n('<'),
         TYPE_AAB,
-        lambda global_state, x, y:
-            poly_cmp(global_state, x, y, lambda a, b: a < b)
+        relational_op(operator.lt)
     ),
     BuiltinFunction(
         i18n.i18n('<='),
         TYPE_AAB,
-        lambda global_state, x, y:
-            poly_cmp(global_state, x, y, lambda a, b: a <= b)
+        relational_op(operator.le)
     ),
     BuiltinFunction(
         i18n.i18n('>='),
         TYPE_AAB,
-        lambda global_state, x, y:
-            poly_cmp(global_state, x, y, lambda a, b: a >= b)
+        relational_op(operator.ge)
     ),
     BuiltinFunction(
         i18n.i18n('>'),
         TYPE_AAB,
-        lambda global_state, x, y:
-            poly_cmp(global_state, x, y, lambda a, b: a > b)
+        relational_op(operator.gt)
     ),
 
     ## Logical operators
@@ -577,20 +729,17 @@ BUILTINS = [
     BuiltinFunction(
         i18n.i18n('not'),
         TYPE_BB,
-        lambda global_state, x:
-            logical_op(logical_not, global_state, x)
+        logical_not
     ),
     BuiltinFunction(
         i18n.i18n('&&'),
         TYPE_BBB,
-        lambda global_state, x, y:
-            logical_op(logical_and, global_state, x, y)
+        logical_and
     ),
     BuiltinFunction(
         i18n.i18n('||'),
         TYPE_BBB,
-        lambda global_state, x, y:
-            logical_op(logical_or, global_state, x, y)
+        logical_or
     ),
 
     # Arithmetic operators
@@ -598,41 +747,35 @@ BUILTINS = [
     BuiltinFunction(
         i18n.i18n('+'),
         TYPE_III,
-        lambda global_state, x, y:
-            arith_op(arith_add, global_state, x, y)
+        arith_add
     ),
     BuiltinFunction(
         i18n.i18n('-'),
         TYPE_III,
-        lambda global_state, x, y:
-            arith_op(arith_sub, global_state, x, y)
+        arith_sub
     ),
     BuiltinFunction(
         i18n.i18n('*'),
         TYPE_III,
-        lambda global_state, x, y:
-            arith_op(arith_mul, global_state, x, y)
+        arith_mul
     ),
     BuiltinFunction(
         i18n.i18n('^'),
         TYPE_III,
-        lambda global_state, x, y:
-            arith_op(arith_pow, global_state, x, y)
+        arith_pow
     ),
     BuiltinFunction(
         i18n.i18n('div'),
         TYPE_III,
-        lambda global_state, x, y:
-            arith_op(arith_div, global_state, x, y)
+        arith_div
     ),
     BuiltinFunction(
         i18n.i18n('mod'),
         TYPE_III,
-        lambda global_state, x, y:
-        arith_op(arith_mod, global_state, x, y)
+        arith_mod
     ),
     BuiltinFunction(
-        i18n.i18n('unary-'),
+        UNARY_MINUS_NAME,
         TYPE_AA,
         gbs_poly_opposite
     ),
@@ -641,14 +784,14 @@ BUILTINS = [
 
     BuiltinConstant(i18n.i18n('True'), GbsBoolType(), True),
     BuiltinConstant(i18n.i18n('False'), GbsBoolType(), False),
-    BuiltinConstant(i18n.i18n('North'), GbsDirType(), NORTH),
-    BuiltinConstant(i18n.i18n('South'), GbsDirType(), SOUTH),
-    BuiltinConstant(i18n.i18n('East'), GbsDirType(), EAST),
-    BuiltinConstant(i18n.i18n('West'), GbsDirType(), WEST),
-    BuiltinConstant(i18n.i18n('Color0'), GbsColorType(), COLOR0),
-    BuiltinConstant(i18n.i18n('Color1'), GbsColorType(), COLOR1),
-    BuiltinConstant(i18n.i18n('Color2'), GbsColorType(), COLOR2),
-    BuiltinConstant(i18n.i18n('Color3'), GbsColorType(), COLOR3),
+    BuiltinConstant(DIRECTION_NAMES[0], GbsDirType(), NORTH),
+    BuiltinConstant(DIRECTION_NAMES[2], GbsDirType(), SOUTH),
+    BuiltinConstant(DIRECTION_NAMES[1], GbsDirType(), EAST),
+    BuiltinConstant(DIRECTION_NAMES[3], GbsDirType(), WEST),
+    BuiltinConstant(COLOR_NAMES[0], GbsColorType(), COLOR0),
+    BuiltinConstant(COLOR_NAMES[1], GbsColorType(), COLOR1),
+    BuiltinConstant(COLOR_NAMES[2], GbsColorType(), COLOR2),
+    BuiltinConstant(COLOR_NAMES[3], GbsColorType(), COLOR3),
 ]
 
 #### List functions
@@ -689,47 +832,101 @@ TYPE_TAIL_INIT = GbsForallType(
                         GbsTupleType([GbsListType(TYPEVAR_X)]),
                         GbsTupleType([GbsListType(TYPEVAR_X)])))
 
-def list_operation(global_state, lst, f):
-    """Wrapper for list operations that require the list not to be
-empty (head, tail, init, last).
-"""
-    if len(lst) == 0:
-        msg = global_state.backtrace(i18n.i18n('Empty list'))
-        raise GbsRuntimeException(msg, global_state.area())
-    else:
-        return f(lst)
+class GbsList(object):
+    """Represents an immutable Gobstones list, as a chain of cons
+    cells ending in NIL. Lists share their tails, so cons, head, tail
+    and isNil take constant time."""
+
+    __slots__ = ('_head', '_tail', '_len')
+
+    def __init__(self, head, tail):
+        self._head = head
+        self._tail = tail
+        self._len = tail._len + 1
+
+    def head(self):
+        "Return the first element of a non-empty list."
+        return self._head
+
+    def tail(self):
+        "Return the list without its first element."
+        return self._tail
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        cell = self
+        while cell._len > 0:
+            yield cell._head
+            cell = cell._tail
+
+    def __repr__(self):
+        return repr(list(self))
+
+def _empty_list():
+    "Create the empty list. There is only one, NIL."
+    nil = object.__new__(GbsList)
+    nil._head = nil._tail = None
+    nil._len = 0
+    return nil
+
+NIL = _empty_list()
+
+def gbs_list(elements):
+    "Return the GbsList with the given elements, in order."
+    res = NIL
+    for elem in reversed(list(elements)):
+        res = GbsList(elem, res)
+    return res
+
+def empty_list_error(global_state):
+    """Return the exception for a list operation that requires the
+    list not to be empty (head, tail, init, last)."""
+    msg = lambda: global_state.backtrace(i18n.i18n('Empty list'))
+    return GbsRuntimeException(msg, global_state.area())
 
 def list_head(global_state, lst):
     "Return the first element of the list."
-    return list_operation(global_state, lst, lambda lst: lst[0])
+    if not lst:
+        raise empty_list_error(global_state)
+    return lst.head()
 
 def list_tail(global_state, lst):
     "Return the tail of the list."
-    return list_operation(global_state, lst, lambda lst: lst[1:])
+    if not lst:
+        raise empty_list_error(global_state)
+    return lst.tail()
 
 def list_last(global_state, lst):
     "Return the last element of the list."
-    return list_operation(global_state, lst, lambda lst: lst[-1])
+    if not lst:
+        raise empty_list_error(global_state)
+    for elem in lst:
+        pass
+    return elem
 
 def list_init(global_state, lst):
     "Return the initial segment of the list."
-    return list_operation(global_state, lst, lambda lst: lst[:-1])
+    if not lst:
+        raise empty_list_error(global_state)
+    return gbs_list(list(lst)[:-1])
 
 LIST_BUILTINS = [
     BuiltinFunction(
         i18n.i18n('nil'),
         TYPE_NIL,
-        lambda global_state: []
+        lambda global_state: NIL
     ),
     BuiltinFunction(
         i18n.i18n('cons'),
         TYPE_CONS,
-        lambda global_state, x, xs: [x] + xs
+        lambda global_state, x, xs: GbsList(x, xs)
     ),
     BuiltinFunction(
         i18n.i18n('snoc'),
         TYPE_SNOC,
-        lambda global_state, xs, x: xs + [x]
+        lambda global_state, xs, x: gbs_list(list(xs) + [x])
     ),
     BuiltinFunction(
         i18n.i18n('isNil'),
@@ -763,15 +960,10 @@ def _is_int_constant(string):
     - It can start with a minus sign.
     - It should have at least one digit.
     - The remaining elements should all be digits in 0..9."""
-    digs = '0123456789'
-    if len(string) == 0 or (string[0] == '-' and len(string) == 1):
-        return False
-    if string[0] not in '-' + digs:
-        return False
-    for char in string[1:]:
-        if char not in digs:
-            return False
-    return True
+    if string[:1] == '-':
+        string = string[1:]
+    # str.isdigit would also accept non-ASCII digits
+    return string != '' and string.lstrip('0123456789') == ''
         
 #### Uncomment to enable the list extensions.
 #BUILTINS += LIST_BUILTINS
@@ -779,10 +971,10 @@ def _is_int_constant(string):
 ####
 
 COLORS_BY_INITIAL = {
-    i18n.i18n('Color0')[0].lower(): COLOR0,
-    i18n.i18n('Color1')[0].lower(): COLOR1,
-    i18n.i18n('Color2')[0].lower(): COLOR2,
-    i18n.i18n('Color3')[0].lower(): COLOR3,
+    COLOR_NAMES[0][0].lower(): COLOR0,
+    COLOR_NAMES[1][0].lower(): COLOR1,
+    COLOR_NAMES[2][0].lower(): COLOR2,
+    COLOR_NAMES[3][0].lower(): COLOR3,
 }
 
 def _color_name_to_index_dict():
@@ -795,30 +987,50 @@ def _color_name_to_index_dict():
     The index is the order of the color in the Color enumerated
     type."""
     dic = {}
-    for coli in range(NUM_COLORS):
-        name = Color(coli).name()
-        dic[name] = coli
-        dic[name.lower()] = coli
-        dic[name[0]] = coli
-        dic[name[0].lower()] = coli
-        dic[coli] = coli
+    for coli, name in enumerate(COLOR_NAMES):
+        initial = name[0]
+        for key in (name, name.lower(), initial, initial.lower(), coli):
+            # colors should be distinguishable by their initials
+            assert dic.get(key, coli) == coli, key
+            dic[key] = coli
     return dic
 
 COLOR_NAME_TO_INDEX_DICT = _color_name_to_index_dict()
 
+UNCHECKED_BUILTINS_BY_NAME = {}
+
+def _initialize_unchecked_builtins():
+    """Initialize the dictionary mapping builtin names to the
+    constructs that should replace them in typechecked programs."""
+    for builtin in BUILTINS:
+        unchecked = UNCHECKED_PRIMITIVES.get(builtin.primitive())
+        if unchecked is not None:
+            UNCHECKED_BUILTINS_BY_NAME[builtin.name()] = builtin.__class__(
+                builtin.name(), builtin.gbstype(), unchecked)
+
+_initialize_unchecked_builtins()
+
 #### Polymorphic builtins
 
-BUILTINS_POLYMORPHIC = {
-    i18n.i18n('next'): True,
-    i18n.i18n('prev'): True,
-    i18n.i18n('opposite'): True,
-    i18n.i18n('unary-'): True,
-}
+BUILTINS_POLYMORPHIC = frozenset([
+    NEXT_NAME,
+    PREV_NAME,
+    OPPOSITE_NAME,
+    UNARY_MINUS_NAME,
+])
 
 def poly_encode_type(type_name):
     """Return an encoding of the given type name."""
     return type_name
 
+# polyname results, keyed by the function name followed by the type names.
+# Only the polymorphic builtins applied to basic types are memoized, so
+# that the dictionary stays bounded: other polynames may be built from
+# user variable names or fresh type variables.
+_POLYNAMES = {}
+
+_POLYNAME_TYPES = frozenset(BasicTypes.keys())
+
 def polyname(fname, types):
     """Given a function name and a list of types, return a
     "polymorphic function name", which corresponds to the concrete
@@ -826,7 +1038,13 @@ def polyname(fname, types):
     function to arguments of those types. For instance, when
     applying siguiente to an integer, the polyname might be
     something like "siguiente@Int"."""
-    return fname + '@' + '@'.join([poly_encode_type(typ) for typ in types])
+    key = (fname,) + tuple(types)
+    name = _POLYNAMES.get(key)
+    if name is None:
+        name = fname + '@' + '@'.join([poly_encode_type(typ) for typ in types])
+        if fname in BUILTINS_POLYMORPHIC and _POLYNAME_TYPES.issuperset(types):
+            _POLYNAMES[key] = name
+    return name
 
 def polyname_name(name):
     """Given the polyname of a function, return the original
@@ -845,44 +1063,43 @@ def _poly_args(builtin):
     list of parameter types. For a polymorphic function, the
     number of possible parameter types could grow exponentially
     on the number of parameters."""
-    def gen(length):
-        """Generate all possible lists of parameter types, of the
-        given length."""
-        if length == 0:
-            yield []
-        else:
-            for param_types in gen(length - 1):
-                for basic_type in BasicTypes.keys():
-                    yield [basic_type] + param_types
-    for param_types in gen(len(builtin.gbstype().parameters())):
-        yield param_types
-
-def _initialize_poly_builtins():
-    """Add one builtin function/procedure for each polyname of
-    every polymorphic builtin function/procedure."""
+    basic_types = tuple(BasicTypes.keys())
+    nparams = len(builtin.gbstype().parameters())
+    if nparams > 1:
+        # all the current polymorphic builtins take a single parameter
+        sys.stderr.write(
+            'PyGobstones warning: polymorphic builtin %s takes %i '
+            'parameters, instantiated for %i combinations of types\n' % (
+                builtin.name(), nparams, len(basic_types) ** nparams))
+    for param_types in itertools.product(basic_types, repeat=nparams):
+        yield list(param_types)
+
+BUILTINS_BY_NAME = {}
+
+def _initialize_builtins():
+    """In a single pass over the builtins, add one builtin
+    function/procedure for each polyname of every polymorphic
+    builtin function/procedure, and initialize the dictionary
+    of builtins mapping builtin names to constructs."""
+    poly_builtins = []
     for builtin in BUILTINS:
-        if builtin.name() not in BUILTINS_POLYMORPHIC:
+        name = builtin.name()
+        BUILTINS_BY_NAME[name] = builtin
+        if name not in BUILTINS_POLYMORPHIC:
             continue
         for param_types in _poly_args(builtin):
-            pname = polyname(builtin.name(), param_types)
-            BUILTINS.append(RenameConstruct(pname, builtin))
+            pname = polyname(name, param_types)
+            renamed = RenameConstruct(pname, builtin)
+            poly_builtins.append(renamed)
+            BUILTINS_BY_NAME[pname] = renamed
+    BUILTINS.extend(poly_builtins)
 
-_initialize_poly_builtins()
+_initialize_builtins()
 
 BUILTIN_NAMES = [b.name() for b in BUILTINS]
 
 CORRECT_NAMES = BUILTIN_NAMES + ['Main']
 
-BUILTINS_BY_NAME = {}
-
-def _initialize_builtins_by_name():
-    """Initialize the dictionary of builtins mapping builtin
-    names to constructs."""
-    for builtin in BUILTINS:
-        BUILTINS_BY_NAME[builtin.name()] = builtin
-
-_initialize_builtins_by_name()
-
 ##
 
 def parse_constant(string):
@@ -890,8 +1107,9 @@ def parse_constant(string):
     an object representing that value."""
     if _is_int_constant(string):
         return int(string)
-    if string in BUILTINS_BY_NAME:
-        return BUILTINS_BY_NAME[string].primitive()
+    builtin = BUILTINS_BY_NAME.get(string)
+    if builtin is not None:
+        return builtin.primitive()
     else:
         return None
 
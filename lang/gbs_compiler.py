@@ -17,8 +17,11 @@
 
 "Gobstones compiler from source ASTs to virtual machine code."
 
+import itertools
+
 import lang.gbs_vm
 import lang.gbs_builtins
+import lang.gbs_constructs
 import common.i18n as i18n
 import common.position
 import common.utils
@@ -27,27 +30,95 @@ class GbsCompileException(common.utils.StaticException):
     "Base exception for Gobstones compiler errors."
     pass
 
+# Values of the builtin constants (booleans, directions and colors),
+# by name. This is a small fixed set, so it is built once; integer
+# literals are parsed each time instead.
+_CONSTANTS = dict([
+    (builtin.name(), builtin.primitive())
+    for builtin in lang.gbs_builtins.BUILTINS
+    if isinstance(builtin, lang.gbs_constructs.BuiltinConstant)
+])
+
 def parse_literal(tok):
     """Given a token, parse its string value and return the denotated
 Gobstones value.
 """
-    val = lang.gbs_builtins.parse_constant(tok.value)
-    assert val is not None
+    val = _CONSTANTS.get(tok.value)
+    if val is None:
+        val = lang.gbs_builtins.parse_constant(tok.value)
+        assert val is not None
     return val
 
-class GbsLabel(object):
-    "Represents a unique label in the program."
-    def __repr__(self):
-        return 'L_%s' % (id(self),)
+_TRUE = lang.gbs_builtins.parse_constant('True')
+_FALSE = lang.gbs_builtins.parse_constant('False')
+_POLYMORPHIC = lang.gbs_builtins.BUILTINS_POLYMORPHIC
+
+_LABELS = itertools.count(1)
+
+def new_label():
+    """Return a fresh label. Labels are plain integers, unique across
+all the compiled modules, since the JIT lays every routine out in a single
+program.
+"""
+    return next(_LABELS)
+
+# Names of the GbsCompiler methods that handle each kind of node.
+# Skip commands emit no code and have no handler.
+_CMD_HANDLERS = {
+    'BOOM': 'compile_boom',
+    'procCall': 'compile_proc_call',
+    'assignVarName': 'compile_assign_var_name',
+    'assignVarTuple1': 'compile_assign_var_tuple1',
+    'if': 'compile_if',
+    'case': 'compile_case',
+    'while': 'compile_while',
+    'repeatWith': 'compile_repeat_with',
+    'block': 'compile_block',
+    'return': 'compile_return',
+}
+
+_EXP_HANDLERS = {
+    'or': 'compile_or',
+    'and': 'compile_and',
+    'not': 'compile_not',
+    'relop': 'compile_binary_op',
+    'addsub': 'compile_binary_op',
+    'mul': 'compile_binary_op',
+    'divmod': 'compile_binary_op',
+    'pow': 'compile_binary_op',
+    'varName': 'compile_var_name',
+    'funcCall': 'compile_func_call',
+    'unaryMinus': 'compile_unary_minus',
+    'literal': 'compile_literal',
+}
+
+def _bind_handlers(compiler, handlers):
+    "Map each node tag to the corresponding bound method of the compiler."
+    return dict([(tag, getattr(compiler, name))
+                 for tag, name in handlers.items()])
 
 class GbsCompiler(object):
     "Compiler of Gobstones programs."
 
-    def __init__(self):
+    __slots__ = (
+        'code', 'temp_counter', 'module_handler', '_current_def_name',
+        '_compiled_modules', '_cmd_handlers', '_exp_handlers',
+    )
+
+    def __init__(self, compiled_modules=None):
         self.code = None
         self.temp_counter = None
         self.module_handler = None
         self._current_def_name = None
+        # Compiled code of the modules seen so far, by file name, shared
+        # with the compilers of the imported modules
+        if compiled_modules is None:
+            compiled_modules = {}
+        self._compiled_modules = compiled_modules
+        # Bind the visitor methods once, so that each node is dispatched
+        # with a single lookup and subclasses may override any handler.
+        self._cmd_handlers = _bind_handlers(self, _CMD_HANDLERS)
+        self._exp_handlers = _bind_handlers(self, _EXP_HANDLERS)
 
     def compile_program(self, tree, module_prefix=''):
         """Given an AST for a full program, compile it to virtual machine
@@ -68,23 +139,29 @@ Every other module should be given the module name as a prefix.
         return self.code
 
     def compile_imported_modules(self, tree):
-        "Recursively compile the imported modules."
+        """Recursively compile the imported modules. A module imported
+from several places is compiled only once.
+"""
         for mdl_name, mdl_tree in self.module_handler.parse_trees():
-            compiler = GbsCompiler()
-            try:
-                code = compiler.compile_program(
-                           mdl_tree, module_prefix=mdl_name
-                       )
-            except common.utils.SourceException as exception:
-                self.module_handler.reraise(
-                    GbsCompileException,
-                    exception,
-                    i18n.i18n(
-                        'Error compiling module %s'
-                    ) % (
-                        mdl_name,
-                    ),
-                    common.position.ProgramAreaNear(tree.children[1]))
+            mdl_filename = self.module_handler.filename_for(mdl_name)
+            code = self._compiled_modules.get(mdl_filename)
+            if code is None:
+                compiler = GbsCompiler(self._compiled_modules)
+                try:
+                    code = compiler.compile_program(
+                               mdl_tree, module_prefix=mdl_name
+                           )
+                except common.utils.SourceException as exception:
+                    self.module_handler.reraise(
+                        GbsCompileException,
+                        exception,
+                        i18n.i18n(
+                            'Error compiling module %s'
+                        ) % (
+                            mdl_name,
+                        ),
+                        common.position.ProgramAreaNear(tree.children[1]))
+                self._compiled_modules[mdl_filename] = code
             self.module_handler.set_compiled_code(mdl_name, code)
 
     def compile_imports(self, imports):
@@ -141,35 +218,20 @@ namespace of routines.
 
     def compile_commands(self, tree, code):
         "Compile a sequence of commands."
+        # Each command is dispatched here directly to its handler,
+        # with no intermediate per-command method call.
+        handlers = self._cmd_handlers
         for cmd in tree.children:
-            self.compile_cmd(cmd, code)
-
-    def compile_cmd(self, tree, code):
-        "Compile a single command."
-        command = tree.children[0]
-        dispatch = {
-            'Skip': self.compile_skip,
-            'BOOM': self.compile_boom,
-            'procCall': self.compile_proc_call,
-            'assignVarName': self.compile_assign_var_name,
-            'assignVarTuple1': self.compile_assign_var_tuple1,
-            'if': self.compile_if,
-            'case': self.compile_case,
-            'while': self.compile_while,
-            'repeatWith': self.compile_repeat_with,
-            'block': self.compile_block,
-            'return': self.compile_return,
-        }
-        assert command in dispatch
-        dispatch[command](tree, code)
-
-    def compile_skip(self, tree, code):
-        "Compile a Skip command."
-        pass
+            handler = handlers.get(cmd.children[0])
+            if handler is None:
+                # Skip emits no code, so it has no handler
+                assert cmd.children[0] == 'Skip'
+                continue
+            handler(cmd, code)
 
     def compile_boom(self, tree, code):
         "Compile a BOOM command."
-        code.push(('BOOM', tree.children[1].value), near=tree)
+        code.push(('BOOM', tree.children[1].value), tree)
 
     def compile_proc_call(self, tree, code):
         "Compile a procedure call."
@@ -177,34 +239,33 @@ namespace of routines.
         args = tree.children[2].children
         for arg in args:
             self.compile_expression(arg, code)
-        code.push(('call', procname, len(args)), near=tree)
+        code.push(('call', procname, len(args)), tree)
 
     def compile_assign_var_name(self, tree, code):
         "Compile a variable assignment: var := <expr>"
         self.compile_expression(tree.children[2], code)
-        code.push(('assign', tree.children[1].value), near=tree)
+        code.push(('assign', tree.children[1].value), tree)
 
     def compile_assign_var_tuple1(self, tree, code):
         "Compile a tuple assignment: (v1, ..., vN) := f(...)"
         self.compile_expression(tree.children[2], code)
-        varnames = [var.value for var in tree.children[1].children]
-        for var in common.utils.seq_reversed(varnames):
-            code.push(('assign', var), near=tree)
+        for var in reversed(tree.children[1].children):
+            code.push(('assign', var.value), tree)
 
     def compile_if(self, tree, code):
         "Compile a conditional statement."
-        lelse = GbsLabel()
-        self.compile_expression(tree.children[1], code) # cond
-        code.push((('jumpIfFalse'), lelse), near=tree)
-        self.compile_block(tree.children[2], code) # then
-        if tree.children[3] is None:
-            code.push(('label', lelse), near=tree)
+        _, cond, then, else_ = tree.children
+        lelse = new_label()
+        self.compile_expression(cond, code)
+        code.push((('jumpIfFalse'), lelse), tree)
+        self.compile_block(then, code)
+        if else_ is None:
+            code.push(('label', lelse), tree)
         else:
-            lend = GbsLabel()
-            code.push(('jump', lend), near=tree)
-            code.push(('label', lelse), near=tree)
-            self.compile_block(tree.children[3], code) # else
-            code.push(('label', lend), near=tree)
+            lend = new_label()
+            code.push_many([('jump', lend), ('label', lelse)], tree)
+            self.compile_block(else_, code)
+            code.push(('label', lend), tree)
 
     def compile_case(self, tree, code):
         "Compile a case statement."
@@ -225,37 +286,39 @@ namespace of routines.
         value0 = self.temp_varname()
         # value0 := value
         self.compile_expression(value, code)
-        code.push(('assign', value0), near=tree)
+        code.push(('assign', value0), tree)
         
-        lend = GbsLabel()
+        lend = new_label()
         next_label = None
         for branch in tree.children[2].children:
             if next_label is not None:
-                code.push(('label', next_label), near=tree)
+                code.push(('label', next_label), tree)
             if branch.children[0] == 'branch':
                 lits = [parse_literal(lit) for lit in branch.children[1].children]
-                next_label = GbsLabel()
+                next_label = new_label()
                 # if value0 in LitsI
-                code.push(('pushVar', value0), near=tree)
-                code.push(('jumpIfNotIn', lits, next_label), near=tree)
+                code.push_many([
+                    ('pushVar', value0),
+                    ('jumpIfNotIn', lits, next_label),
+                ], tree)
                 # BodyI
                 self.compile_block(branch.children[2], code)
-                code.push(('jump', lend), near=tree)
+                code.push(('jump', lend), tree)
             else: # defaultBranch
                 # BodyElse
                 self.compile_block(branch.children[1], code)
-        code.push(('label', lend), near=tree)
+        code.push(('label', lend), tree)
 
     def compile_while(self, tree, code):
         "Compile a while statement."
-        lbegin = GbsLabel()
-        lend = GbsLabel()
-        code.push(('label', lbegin), near=tree)
-        self.compile_expression(tree.children[1], code) # cond
-        code.push(('jumpIfFalse', lend), near=tree)
-        self.compile_block(tree.children[2], code) # body
-        code.push(('jump', lbegin), near=tree)
-        code.push(('label', lend), near=tree)
+        _, cond, body = tree.children
+        lbegin = new_label()
+        lend = new_label()
+        code.push(('label', lbegin), tree)
+        self.compile_expression(cond, code)
+        code.push(('jumpIfFalse', lend), tree)
+        self.compile_block(body, code)
+        code.push_many([('jump', lbegin), ('label', lend)], tree)
 
     def compile_repeat_with(self, tree, code):
         "Compile a repeatWith statement."
@@ -275,53 +338,51 @@ namespace of routines.
         #     }
         #   }
         #
-        def call_next():
-            """Add a VM instruction for calling the builtin 'next' function,
-which operates on any iterable value.
-"""
-            name = i18n.i18n('next')
-            if hasattr(tree, 'index_type_annotation'):
-                name = lang.gbs_builtins.polyname(
-                    name,
-                    [repr(tree.index_type_annotation)])
-            code.push(('call', name, 1), near=tree)
-
         # upper0 is preserved in the stack
-        i = tree.children[1].value
-        limit_lower = tree.children[2].children[1]
-        limit_upper = tree.children[2].children[2]
-        body = tree.children[3]
+        _, var, limits, body = tree.children
+        _, limit_lower, limit_upper = limits.children
+        i = var.value
         upper0 = self.temp_varname()
-        lbegin = GbsLabel()
-        lend = GbsLabel()
+        # the builtin 'next' function operates on any iterable value
+        next_name = lang.gbs_builtins.NEXT_NAME
+        if tree.index_type_annotation is not None:
+            next_name = lang.gbs_builtins.polyname(
+                next_name,
+                [repr(tree.index_type_annotation)])
+        lbegin = new_label()
+        lend = new_label()
         # i := Lower
         self.compile_expression(limit_lower, code)
-        code.push(('assign', i), near=tree)
+        code.push(('assign', i), tree)
         # upper0 := Upper
         self.compile_expression(limit_upper, code)
-        code.push(('assign', upper0), near=tree)
-        # if i <= upper0
-        code.push(('pushVar', i), near=tree)
-        code.push(('pushVar', upper0), near=tree)
-        code.push(('call', '<=', 2), near=tree)
-        code.push(('jumpIfFalse', lend), near=tree)
-        # while true
-        code.push(('label', lbegin), near=tree)
+        code.push(('assign', upper0), tree)
+        code.push_many([
+            # if i <= upper0
+            ('pushVar', i),
+            ('pushVar', upper0),
+            ('call', '<=', 2),
+            ('jumpIfFalse', lend),
+            # while true
+            ('label', lbegin),
+        ], tree)
         # body
         self.compile_block(body, code)
-        # if (i == upper0) break
-        code.push(('pushVar', i), near=tree)
-        code.push(('pushVar', upper0), near=tree)
-        code.push(('call', '/=', 2), near=tree)
-        code.push(('jumpIfFalse', lend), near=tree)
-        # i := next(i)
-        code.push(('pushVar', i), near=tree)
-        call_next()
-        code.push(('assign', i), near=tree)
-        # end while
-        code.push(('jump', lbegin), near=tree)
-        code.push(('label', lend), near=tree)
-        code.push(('delVar', i), near=tree)
+        code.push_many([
+            # if (i == upper0) break
+            ('pushVar', i),
+            ('pushVar', upper0),
+            ('call', '/=', 2),
+            ('jumpIfFalse', lend),
+            # i := next(i)
+            ('pushVar', i),
+            ('call', next_name, 1),
+            ('assign', i),
+            # end while
+            ('jump', lbegin),
+            ('label', lend),
+            ('delVar', i),
+        ], tree)
 
     def compile_block(self, tree, code):
         "Compile a block statement."
@@ -329,12 +390,12 @@ which operates on any iterable value.
 
     def compile_return(self, tree, code):
         "Compile a return statement."
-        vals = tree.children[1].children 
+        vals = tree.children[1].children
         for val in vals:
             self.compile_expression(val, code)
         if self._current_def_name == 'Main':
-            vrs = [v.children[1].value for v in tree.children[1].children]
-            if hasattr(tree, 'type_annot'):
+            vrs = [v.children[1].value for v in vals]
+            if tree.type_annot is not None:
                 # Decorate the return variables with their types.
                 types = [
                     repr(subtype)
@@ -344,104 +405,111 @@ which operates on any iterable value.
                     lang.gbs_builtins.polyname(vname, [vtype])
                     for vname, vtype in zip(vrs, types)
                 ]
-            code.push(('returnVars', len(vals), vrs), near=tree)
+            code.push(('returnVars', len(vals), vrs), tree)
         else:
-            code.push(('return', len(vals)), near=tree)
+            code.push(('return', len(vals)), tree)
     
     #### Expressions
+    ####
+    #### Expressions may nest arbitrarily deep (e.g. a long chain of
+    #### additions), so they are not compiled by recursion. Instead, the
+    #### handler of a compound expression is a generator that yields each
+    #### subexpression at the point where its code should be emitted,
+    #### and compile_expression drives the generators with an explicit
+    #### stack. Handlers of leaf expressions just emit their code.
 
     def compile_expression(self, tree, code):
         "Compile an expression."
-        exptype = tree.children[0]
-        dispatch = {
-          'or': self.compile_or,
-          'and': self.compile_and,
-          'not': self.compile_not,
-          'relop': self.compile_binary_op,
-          'addsub': self.compile_binary_op,
-          'mul': self.compile_binary_op,
-          'divmod': self.compile_binary_op,
-          'pow': self.compile_binary_op,
-          'varName': self.compile_var_name,
-          'funcCall': self.compile_func_call,
-          'unaryMinus': self.compile_unary_minus,
-          'literal': self.compile_literal,
-        }
-        assert exptype in dispatch
-        dispatch[exptype](tree, code)
+        handlers = self._exp_handlers
+        stack = []
+        while True:
+            if tree is not None:
+                handler = handlers.get(tree.children[0])
+                assert handler is not None
+                pending = handler(tree, code)
+                if pending is not None:
+                    stack.append(pending)
+            if not stack:
+                break
+            # Resume the innermost unfinished expression
+            tree = next(stack[-1], None)
+            if tree is None:
+                stack.pop()
 
     def compile_binary_op(self, tree, code):
         "Compile a binary operator expression."
-        self.compile_expression(tree.children[2], code)
-        self.compile_expression(tree.children[3], code)
-        code.push(('call', tree.children[1].value, 2), near=tree)
+        _, opr, left, right = tree.children
+        yield left
+        yield right
+        code.push(('call', opr.value, 2), tree)
 
     def compile_not(self, tree, code):
         "Compile a boolean not expression."
-        self.compile_expression(tree.children[1], code)
-        code.push(('call', 'not', 1), near=tree)
+        yield tree.children[1]
+        code.push(('call', 'not', 1), tree)
 
     def compile_or(self, tree, code):
         "Compile a short-circuiting disjunction."
-        lcontinue = GbsLabel()
-        lend = GbsLabel()
-        self.compile_expression(tree.children[2], code)
-        code.push(('jumpIfFalse', lcontinue), near=tree)
-        code.push(('pushConst', lang.gbs_builtins.parse_constant('True')),
-                  near=tree)
-        code.push(('jump', lend), near=tree)
-        code.push(('label', lcontinue), near=tree)
-        self.compile_expression(tree.children[3], code)
-        code.push(('label', lend), near=tree)
+        _, _, left, right = tree.children
+        lcontinue = new_label()
+        lend = new_label()
+        yield left
+        code.push_many([
+            ('jumpIfFalse', lcontinue),
+            ('pushConst', _TRUE),
+            ('jump', lend),
+            ('label', lcontinue),
+        ], tree)
+        yield right
+        code.push(('label', lend), tree)
 
     def compile_and(self, tree, code):
         "Compile a short-circuiting conjunction."
-        lcontinue = GbsLabel()
-        lend = GbsLabel()
-        self.compile_expression(tree.children[2], code)
-        code.push(('jumpIfFalse', lcontinue), near=tree)
-        self.compile_expression(tree.children[3], code)
-        code.push(('jump', lend), near=tree)
-        code.push(('label', lcontinue), near=tree)
-        code.push(('pushConst', lang.gbs_builtins.parse_constant('False')),
-                  near=tree)
-        code.push(('label', lend), near=tree)
+        _, _, left, right = tree.children
+        lcontinue = new_label()
+        lend = new_label()
+        yield left
+        code.push(('jumpIfFalse', lcontinue), tree)
+        yield right
+        code.push_many([
+            ('jump', lend),
+            ('label', lcontinue),
+            ('pushConst', _FALSE),
+            ('label', lend),
+        ], tree)
 
     def compile_unary_minus(self, tree, code):
         "Compile a unary minus expression."
-        funcname = 'unary-'
+        funcname = lang.gbs_builtins.UNARY_MINUS_NAME
         args = tree.children[1:]
-        self._compile_func_call_poly(tree, funcname, args, code)
+        return self._compile_func_call_poly(tree, funcname, args, code)
 
     def compile_var_name(self, tree, code):
         "Compile a variable name expression."
-        code.push(('pushVar', tree.children[1].value), near=tree)
+        code.push(('pushVar', tree.children[1].value), tree)
 
     def compile_func_call(self, tree, code):
         "Compile a function call."
         funcname = tree.children[1].value
         args = tree.children[2].children
-        self._compile_func_call_poly(tree, funcname, args, code)
+        return self._compile_func_call_poly(tree, funcname, args, code)
 
     def _compile_func_call_poly(self, tree, funcname, args, code):
         "Compile a potentially polymorphic function call."
-        polys = lang.gbs_builtins.BUILTINS_POLYMORPHIC
-        annotate = True
-        annotate = annotate and funcname in polys
-        annotate = annotate and hasattr(tree, 'type_annotation')
-        annotate = annotate and isinstance(tree.type_annotation, list)
+        annotate = (funcname in _POLYMORPHIC and
+                    isinstance(tree.type_annotation, list))
         for arg in args:
-            self.compile_expression(arg, code)
+            yield arg
         if annotate:
             funcname = lang.gbs_builtins.polyname(
                 funcname,
                 [repr(ann) for ann in tree.type_annotation])
-        code.push(('call', funcname, len(args)), near=tree)
+        code.push(('call', funcname, len(args)), tree)
 
     def compile_literal(self, tree, code):
         "Compile a constant expression."
         tok = tree.children[1]
-        code.push(('pushConst', parse_literal(tok)), near=tree)
+        code.push(('pushConst', parse_literal(tok)), tree)
 
 def compile_program(tree):
     "Compile a full Gobstones program."
@@ -99,6 +99,8 @@ class GbsTypeInference(object):
         self.infer_imports(imports)
         defs = tree.children[2]
         self.infer_defs(defs)
+        # the compiler relies on this to skip dynamic type checks
+        tree.typechecked = True
 
     def infer_imports(self, imports):
         "Add the types of all the imported routines to the global context."
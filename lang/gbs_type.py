@@ -35,6 +35,15 @@ class GbsType(object):
 ## Basic types
 
 class GbsBasicType(GbsType):
+  # basic types are immutable, so each of them has a single instance,
+  # which is initialized once, here, and never by __init__
+  def __new__(cls):
+    instance = cls.__dict__.get('_instance')
+    if instance is None:
+      instance = GbsType.__new__(cls)
+      instance._name = i18n.i18n(cls.type_name)
+      cls._instance = instance
+    return instance
   def __repr__(self):
     return self._name
   def occurs(self, var):
@@ -45,20 +54,16 @@ class GbsBasicType(GbsType):
     return set_new()
 
 class GbsColorType(GbsBasicType):
-  def __init__(self):
-    self._name = i18n.i18n('Color')
+  type_name = 'Color'
 
 class GbsDirType(GbsBasicType):
-  def __init__(self):
-    self._name = i18n.i18n('Dir')
+  type_name = 'Dir'
 
 class GbsBoolType(GbsBasicType):
-  def __init__(self):
-    self._name = i18n.i18n('Bool')
+  type_name = 'Bool'
 
 class GbsIntType(GbsBasicType):
-  def __init__(self):
-    self._name = i18n.i18n('Int')
+  type_name = 'Int'
 
 ## Type variables
 
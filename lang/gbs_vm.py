@@ -62,6 +62,9 @@ class GbsCompiledProgram(object):
     for b in lang.gbs_builtins.BUILTINS:
       bname, b = b.name(), b.underlying_construct()
       self.builtins[bname] = b
+    if getattr(tree, 'typechecked', False):
+      # argument types are statically known to be right
+      self.builtins.update(lang.gbs_builtins.UNCHECKED_BUILTINS_BY_NAME)
     self.routines = {}
     self.external_routines = {}
     
@@ -82,11 +85,16 @@ class GbsCompiledCode(object):
     if near:
       self.nearby_elems[len(self.ops)] = near
     self.ops.append(op)
+  def push_many(self, ops, near=None):
+    if near:
+      n = len(self.ops)
+      self.nearby_elems.update(dict.fromkeys(range(n, n + len(ops)), near))
+    self.ops.extend(ops)
   def build_label_table(self):
     i = 0
     for op in self.ops:
       if op[0] == 'label':
-        self.label_table[id(op[1])] = i + 1
+        self.label_table[op[1]] = i + 1
       i += 1
   def add_enter(self):
     if self.prfn == 'function':
@@ -252,12 +260,14 @@ class GbsVmInterpreter(object):
       funcName = op[1]
       nargs = op[2]
       assert len(self.stack) >= nargs
-      if funcName in self.program.builtins:
-        builtin = self.program.builtins[funcName]
+      builtin = self.program.builtins.get(funcName)
+      if builtin is not None:
         self.arity_check(builtin, nargs)
-        args = []
-        for i in range(nargs):
-          args.insert(0, self.stack.pop())
+        if nargs > 0:
+          args = self.stack[-nargs:]
+          del self.stack[-nargs:]
+        else:
+          args = ()
         res = builtin.primitive()(self.global_state, *args)
         if builtin.type() == 'function':
           self.stack.append(res) # push result
@@ -290,17 +300,17 @@ class GbsVmInterpreter(object):
       self.ar.ip += 1
 
     elif opcode == 'jump':
-      dest = id(op[1])
+      dest = op[1]
       assert dest in self.ar.routine.label_table
       self.ar.ip = self.ar.routine.label_table[dest]
 
     elif opcode == 'jumpIfFalse':
-      dest = id(op[1])
+      dest = op[1]
       assert dest in self.ar.routine.label_table
       assert len(self.stack) > 0
       val = self.stack.pop()
 
-      if lang.gbs_builtins.poly_typeof(val) != 'Bool':
+      if type(val) is not bool:
         raise GbsVmException(i18n.i18n('Condition should be a boolean'),
                              self.current_area())
       if not val:
@@ -309,7 +319,7 @@ class GbsVmInterpreter(object):
         self.ar.ip += 1
 
     elif opcode == 'jumpIfNotIn':
-      dest = id(op[2])
+      dest = op[2]
       assert dest in self.ar.routine.label_table
       assert len(self.stack) > 0
       val = self.stack.pop()
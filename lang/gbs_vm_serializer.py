@@ -299,9 +299,10 @@ class GbsVmReader(object):
       if op[0] == 'pushConst':
         op[1] = self._parse_constant(op[1])
       elif op[0] in ['jump', 'jumpIfFalse']:
-        op[1] = intern(op[1])
+        op[1] = common.utils.str_intern(op[1])
       elif op[0] == 'jumpIfNotIn':
-        op = op[0], [self._parse_constant(x) for x in op[2:]], intern(op[1])
+        op = (op[0], [self._parse_constant(x) for x in op[2:]],
+              common.utils.str_intern(op[1]))
       elif op[0] == 'returnVars':
         op = op[0], int(op[1]), op[2:]
       elif op[0] == 'call':
@@ -310,7 +311,7 @@ class GbsVmReader(object):
       elif op[0] == 'return':
         op[1] = int(op[1])
       elif op[0] == 'label':
-        op[1] = intern(op[1])
+        op[1] = common.utils.str_intern(op[1])
       code.push(op)
     code.build_label_table()
     return code
@@ -0,0 +1,117 @@
+"Tests for the scheduling of judge runs in gui.judge_app."
+
+import unittest
+
+import gui.judge_app
+
+
+class FakeEditor(object):
+
+    def clear_messages(self, *args):
+        pass
+
+    def start_run(self, onstop=None):
+        pass
+
+    def end_run(self):
+        pass
+
+    def show_error(self, exception):
+        pass
+
+    def make_logger(self):
+        return lambda msg: None
+
+
+class FakeRefDriver(object):
+    "Reference test driver that finishes at once."
+
+    def step(self):
+        return 'END'
+
+
+class FakeDriver(object):
+    "Test driver that counts its steps and never finishes."
+
+    def __init__(self):
+        self.steps = 0
+
+    def step(self):
+        self.steps += 1
+        return 'RUNNING'
+
+
+class FakeJudgeGUI(gui.judge_app.JudgeGUI):
+    """JudgeGUI without a Tk interpreter: the alarms are kept in a
+    dictionary and fired by hand."""
+
+    def __init__(self):
+        self._current_problem = ''
+        self._last_alarm_id = None
+        self._running = False
+        self._problems = {'P': None}
+        self._ref_testdriver = None
+        self._usr_testdriver = None
+        self.editor = FakeEditor()
+        self.alarms = {}
+        self.next_alarm = 0
+        self.usr_drivers = []
+
+    def after(self, delay, func, *args):
+        self.next_alarm += 1
+        alarm_id = 'after#%i' % (self.next_alarm,)
+        self.alarms[alarm_id] = (func, args)
+        return alarm_id
+
+    def after_cancel(self, alarm_id):
+        self.alarms.pop(alarm_id, None)
+
+    def fire_alarms(self):
+        "Fire the alarms that are pending now, once each."
+        alarms = self.alarms
+        self.alarms = {}
+        for func, args in alarms.values():
+            func(*args)
+
+    def _search_problem_name(self):
+        return 'P'
+
+    def _compile_usr_code(self):
+        self._usr_testdriver = FakeDriver()
+        self.usr_drivers.append(self._usr_testdriver)
+        return True
+
+    def _compile_ref_code(self):
+        self._ref_testdriver = FakeRefDriver()
+        return True
+
+
+class TestJudgeRun(unittest.TestCase):
+
+    def test_abort_and_restart(self):
+        ticks = gui.config.IterationsPerTick
+        judge = FakeJudgeGUI()
+        judge.solve_problem_start_run()
+        first = judge.usr_drivers[0]
+        judge.fire_alarms() # the reference driver ends
+        judge.fire_alarms()
+        self.assertEqual(first.steps, ticks)
+
+        # the first run still has a step scheduled when it is aborted
+        self.assertEqual(len(judge.alarms), 1)
+        judge.solve_problem_abort_run()
+        self.assertFalse(judge._running)
+        self.assertEqual(judge.alarms, {})
+
+        judge.solve_problem_start_run()
+        second = judge.usr_drivers[1]
+        self.assertEqual(len(judge.alarms), 1)
+        judge.fire_alarms() # the reference driver ends
+        judge.fire_alarms()
+        # the test drivers are stepped once per tick
+        self.assertEqual(first.steps, ticks)
+        self.assertEqual(second.steps, ticks)
+
+
+if __name__ == '__main__':
+    unittest.main()